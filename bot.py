@@ -1,15 +1,20 @@
 import os
+import sys
 import time
 import math
 import json
-import datetime as dt
 import logging
+import queue
+import signal
 import threading
 import concurrent.futures as cf
+from collections import OrderedDict, deque
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional, Tuple, Set
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Set
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 from pybit.unified_trading import HTTP, WebSocket
 
@@ -43,6 +48,9 @@ FUNDING_LOOKUP_TIMEOUT_SEC = max(1, int(os.environ.get("FUNDING_LOOKUP_TIMEOUT_S
 TG_ALLOWED_USER_ID = os.environ.get("TELEGRAM_ALLOWED_USER_ID", "").strip()
 TG_COMMAND_POLL_TIMEOUT_SEC = max(1, int(os.environ.get("TG_COMMAND_POLL_TIMEOUT_SEC", "25")))
 TG_COMMAND_ERROR_SLEEP_SEC = max(1, int(os.environ.get("TG_COMMAND_ERROR_SLEEP_SEC", "5")))
+TG_BATCH_MAX_MESSAGES = max(1, int(os.environ.get("TG_BATCH_MAX_MESSAGES", "8")))
+TG_BATCH_WINDOW_MS = max(0, int(os.environ.get("TG_BATCH_WINDOW_MS", "500")))
+TG_RATE_LIMIT_PER_MIN = max(1, int(os.environ.get("TG_RATE_LIMIT_PER_MIN", "20")))
 
 # Logging
 logging.basicConfig(
@@ -60,22 +68,44 @@ def require_env(name: str, value: str) -> None:
 # ==========================
 # Helpers
 # ==========================
-def utc_to_local(ts_ms: int, utc_offset_hours: int) -> Tuple[str, str]:
-    utc_dt = dt.datetime.fromtimestamp(ts_ms / 1000, tz=dt.timezone.utc)
-    offset = dt.timedelta(hours=utc_offset_hours)
-    local_dt = utc_dt.astimezone(dt.timezone(offset))
+def make_utc_offset_label(utc_offset_hours: int) -> str:
     sign = "+" if utc_offset_hours >= 0 else "-"
-    return local_dt.strftime("%Y-%m-%d %H:%M:%S"), f"UTC{sign}{abs(utc_offset_hours)}"
+    return f"UTC{sign}{abs(utc_offset_hours)}"
+
+
+LOCAL_TZ_LABEL = make_utc_offset_label(UTC_OFFSET_HOURS)
+
+
+def utc_to_local(ts_ms: int, utc_offset_hours: int) -> Tuple[str, str]:
+    t = time.gmtime(ts_ms // 1000 + utc_offset_hours * 3600)
+    label = LOCAL_TZ_LABEL if utc_offset_hours == UTC_OFFSET_HOURS else make_utc_offset_label(utc_offset_hours)
+    return (
+        "%04d-%02d-%02d %02d:%02d:%02d" % (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec),
+        label,
+    )
+
+
+FIXED_NUM_FORMATTERS: Dict[int, Callable[[float], str]] = {n: ("{:.%df}" % n).format for n in range(11)}
 
 
 def fmt_num(x: Any, nd: int = 6) -> str:
-    try:
-        v = float(x)
-        if math.isfinite(v):
-            return f"{v:.{nd}f}".rstrip("0").rstrip(".")
-    except (ValueError, TypeError):
-        pass
-    return str(x)
+    cls = x.__class__
+    if cls is float:
+        v = x
+    elif cls is int:
+        return str(x)
+    elif x == "—":
+        return x
+    else:
+        try:
+            v = float(x)
+        except (ValueError, TypeError):
+            return str(x)
+    if not math.isfinite(v):
+        return str(x)
+    formatter = FIXED_NUM_FORMATTERS.get(nd)
+    s = formatter(v) if formatter is not None else f"{v:.{nd}f}"
+    return s.rstrip("0").rstrip(".") if nd > 0 else s
 
 
 def to_float(x: Any) -> Optional[float]:
@@ -88,17 +118,39 @@ def to_float(x: Any) -> Optional[float]:
         return None
 
 
+MARKET_TYPE_BY_CATEGORY: Dict[str, str] = {
+    "spot": "Spot",
+    "linear": "Futures (Linear)",
+    "inverse": "Futures (Inverse)",
+    "option": "Options",
+}
+
+ORDER_FINAL_STATUSES: Set[str] = {"filled", "cancelled", "rejected", "deactivated", "partiallyfilledcanceled"}
+
+POSITION_CATEGORIES: Set[str] = {"linear", "inverse", "option"}
+
+BYBIT_TRADE_PATH_BY_CATEGORY: Dict[str, str] = {
+    "spot": "spot",
+    "inverse": "inverse",
+}
+
+
+_normalized_categories: Dict[str, str] = {}
+
+
+def normalize_category(category: Optional[str]) -> str:
+    if not category:
+        return ""
+    c = _normalized_categories.get(category)
+    if c is None:
+        c = sys.intern(category.lower())
+        if len(_normalized_categories) < 64:
+            _normalized_categories[category] = c
+    return c
+
+
 def map_market_type(category: str) -> str:
-    c = (category or "").lower()
-    if c == "spot":
-        return "Spot"
-    if c == "linear":
-        return "Futures (Linear)"
-    if c == "inverse":
-        return "Futures (Inverse)"
-    if c == "option":
-        return "Options"
-    return category or "Unknown"
+    return MARKET_TYPE_BY_CATEGORY.get(normalize_category(category), category or "Unknown")
 
 
 def calc_rr(side: str, entry: Optional[float], sl: Optional[float], tp: Optional[float]) -> Optional[float]:
@@ -177,9 +229,16 @@ def get_interval_ms(interval: str) -> Optional[int]:
     return INTERVAL_TO_MS.get(str(interval))
 
 
+def order_kline_rows_ascending(rows: List[List[Any]]) -> List[List[Any]]:
+    # Bybit v5 отдаёт свечи от новых к старым
+    if len(rows) < 2 or int(rows[0][0]) > int(rows[-1][0]):
+        return rows[::-1]
+    return sorted(rows, key=lambda r: int(r[0]))
+
+
 def parse_kline_rows(rows: List[List[Any]]) -> List[Dict[str, float]]:
     parsed: List[Dict[str, float]] = []
-    for row in sorted(rows, key=lambda r: int(r[0])):
+    for row in order_kline_rows_ascending(rows):
         try:
             parsed.append({
                 "start": float(row[0]),
@@ -202,28 +261,40 @@ def get_completed_klines(rows: List[Dict[str, float]], interval: str) -> List[Di
     if interval_ms is None:
         return rows
 
+    # get_kline_rows уже отдаёт копию
     now_ms = int(time.time() * 1000)
-    completed = list(rows)
-    if completed and now_ms < int(completed[-1]["start"]) + interval_ms:
-        completed.pop()
-    return completed
+    if now_ms < int(rows[-1]["start"]) + interval_ms:
+        return rows[:-1]
+    return rows
 
 
 def calc_rsi_from_closes(closes: List[float], length: int = 14) -> Optional[float]:
     if len(closes) < length + 1:
         return None
-    gains = []
-    losses = []
-    for i in range(1, len(closes)):
-        delta = closes[i] - closes[i - 1]
-        gains.append(max(delta, 0.0))
-        losses.append(max(-delta, 0.0))
 
-    avg_gain = sum(gains[:length]) / length
-    avg_loss = sum(losses[:length]) / length
-    for i in range(length, len(gains)):
-        avg_gain = (avg_gain * (length - 1) + gains[i]) / length
-        avg_loss = (avg_loss * (length - 1) + losses[i]) / length
+    gain_sum = 0.0
+    loss_sum = 0.0
+    for i in range(1, length + 1):
+        delta = closes[i] - closes[i - 1]
+        if delta > 0:
+            gain_sum += delta
+        else:
+            loss_sum -= delta
+
+    avg_gain = gain_sum / length
+    avg_loss = loss_sum / length
+    alpha = 1.0 / length
+    beta = 1.0 - alpha
+    prev = closes[length]
+    for price in closes[length + 1:]:
+        delta = price - prev
+        prev = price
+        if delta > 0:
+            avg_gain = avg_gain * beta + delta * alpha
+            avg_loss = avg_loss * beta
+        else:
+            avg_gain = avg_gain * beta
+            avg_loss = avg_loss * beta - delta * alpha
 
     if avg_loss == 0:
         return 100.0
@@ -244,17 +315,23 @@ def calc_ema_from_closes(closes: List[float], period: int) -> Optional[float]:
 def calc_atr_from_rows(rows: List[Dict[str, float]], length: int = 14) -> Optional[float]:
     if len(rows) < length + 1:
         return None
-    true_ranges: List[float] = []
-    for i in range(1, len(rows)):
-        high = rows[i]["high"]
-        low = rows[i]["low"]
-        prev_close = rows[i - 1]["close"]
-        true_ranges.append(max(high - low, abs(high - prev_close), abs(low - prev_close)))
-    if len(true_ranges) < length:
-        return None
-    atr = sum(true_ranges[:length]) / length
-    for tr in true_ranges[length:]:
-        atr = (atr * (length - 1) + tr) / length
+
+    prev_close = rows[0]["close"]
+    tr_sum = 0.0
+    for row in rows[1:length + 1]:
+        high = row["high"]
+        low = row["low"]
+        tr_sum += max(high - low, abs(high - prev_close), abs(low - prev_close))
+        prev_close = row["close"]
+
+    atr = tr_sum / length
+    alpha = 1.0 / length
+    beta = 1.0 - alpha
+    for row in rows[length + 1:]:
+        high = row["high"]
+        low = row["low"]
+        atr = atr * beta + max(high - low, abs(high - prev_close), abs(low - prev_close)) * alpha
+        prev_close = row["close"]
     return atr
 
 
@@ -283,12 +360,100 @@ def resolve_price_vs_ema_band(price: Optional[float], ema20: Optional[float], em
 # ==========================
 # Telegram
 # ==========================
+TG_API_BASE_URL = f"https://api.telegram.org/bot{TG_TOKEN}"
+TG_BASE_PAYLOAD: Dict[str, Any] = {
+    "parse_mode": "HTML",
+    "disable_web_page_preview": True,
+}
+
+TG_SESSION = requests.Session()
+TG_SESSION.headers.update({"Content-Type": "application/json"})
+TG_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        # Только 502/503: запрос не обработан, дубля сообщения не будет
+        max_retries=Retry(
+            total=3,
+            read=0,
+            status_forcelist=(502, 503),
+            allowed_methods=frozenset({"GET", "POST"}),
+            backoff_factor=0.3,
+            raise_on_status=False,
+        ),
+    ),
+)
+TG_RATE_LIMIT_RETRIES = 2
+TG_CONNECT_TIMEOUT_SEC = 5
+
+
+class RateLimiter:
+    def __init__(self, max_calls: int, period_sec: float) -> None:
+        self.max_calls = max_calls
+        self.period_sec = period_sec
+        self._lock = threading.Lock()
+        self._calls: Deque[float] = deque()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._calls and now - self._calls[0] >= self.period_sec:
+                    self._calls.popleft()
+                if len(self._calls) < self.max_calls:
+                    self._calls.append(now)
+                    return
+                wait_sec = self.period_sec - (now - self._calls[0])
+            time.sleep(wait_sec)
+
+
+# Лимиты Telegram — по чату: ~20/мин в группу, ~1/сек в личку
+TG_PRIVATE_RATE_LIMIT_PER_MIN = 60
+tg_send_limiters: Dict[str, RateLimiter] = {}
+tg_send_limiters_lock = threading.Lock()
+
+
+def get_tg_send_limiter(chat_id: str) -> RateLimiter:
+    with tg_send_limiters_lock:
+        limiter = tg_send_limiters.get(chat_id)
+        if limiter is None:
+            # Личный чат — только положительный числовой id; группы, каналы и @username идут по групповому лимиту
+            is_private = chat_id.isascii() and chat_id.isdigit() and int(chat_id) > 0
+            per_min = TG_PRIVATE_RATE_LIMIT_PER_MIN if is_private else TG_RATE_LIMIT_PER_MIN
+            limiter = RateLimiter(per_min, 60.0)
+            tg_send_limiters[chat_id] = limiter
+        return limiter
+
+
+def get_tg_retry_after_sec(response: requests.Response) -> int:
+    try:
+        parameters = (response.json() or {}).get("parameters") or {}
+        return max(1, int(parameters.get("retry_after") or 1))
+    except (ValueError, TypeError, AttributeError):
+        return 1
+
+
+TG_JSON_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), allow_nan=False)
+
+
 def tg_api_request(method: str, *, params: Optional[Dict[str, Any]] = None, payload: Optional[Dict[str, Any]] = None, timeout: int = 15) -> Dict[str, Any]:
-    url = f"https://api.telegram.org/bot{TG_TOKEN}/{method}"
+    url = f"{TG_API_BASE_URL}/{method}"
+    data = None
     if payload is not None:
-        response = requests.post(url, json=payload, timeout=timeout)
-    else:
-        response = requests.get(url, params=params, timeout=timeout)
+        data = TG_JSON_ENCODER.encode(payload).encode("utf-8")
+
+    for attempt in range(TG_RATE_LIMIT_RETRIES + 1):
+        if data is not None:
+            response = TG_SESSION.post(url, data=data, timeout=(TG_CONNECT_TIMEOUT_SEC, timeout))
+        else:
+            response = TG_SESSION.get(url, params=params, timeout=(TG_CONNECT_TIMEOUT_SEC, timeout))
+        if response.status_code != 429 or attempt == TG_RATE_LIMIT_RETRIES:
+            break
+        retry_after = get_tg_retry_after_sec(response)
+        log.warning("Telegram %s rate limited, retrying in %ss", method, retry_after)
+        time.sleep(retry_after)
+
     if not response.ok:
         raise RuntimeError(f"Telegram {method} failed: {response.status_code} {response.text}")
     body = response.json()
@@ -303,21 +468,81 @@ def tg_send_message(
     thread_id: Optional[str] = None,
     reply_to_message_id: Optional[int] = None,
 ) -> None:
-    payload: Dict[str, Any] = {
-        "chat_id": chat_id or TG_CHAT_ID,
-        "text": text,
-        "parse_mode": "HTML",
-        "disable_web_page_preview": True,
-    }
+    payload: Dict[str, Any] = dict(TG_BASE_PAYLOAD)
+    payload["chat_id"] = str(chat_id or TG_CHAT_ID)
+    payload["text"] = text
     effective_thread_id = thread_id if thread_id is not None else TG_THREAD_ID
     if effective_thread_id:
         payload["message_thread_id"] = int(effective_thread_id)
     if reply_to_message_id:
         payload["reply_to_message_id"] = int(reply_to_message_id)
         payload["allow_sending_without_reply"] = True
+    get_tg_send_limiter(payload["chat_id"]).acquire()
     tg_api_request("sendMessage", payload=payload)
 
 
+TG_MESSAGE_MAX_LEN = 4096
+TG_BATCH_SEPARATOR = "\n\n───\n\n"
+TG_SHUTDOWN_DRAIN_SEC = 20
+tg_outbox: "queue.Queue[str]" = queue.Queue()
+
+
+def tg_enqueue_message(text: str) -> None:
+    tg_outbox.put(text)
+
+
+def telegram_sender_loop() -> None:
+    carry: Optional[str] = None
+    while True:
+        first = carry if carry is not None else tg_outbox.get()
+        carry = None
+        batch = [first]
+        batch_len = len(first)
+        deadline = time.monotonic() + TG_BATCH_WINDOW_MS / 1000.0
+
+        while len(batch) < TG_BATCH_MAX_MESSAGES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                text = tg_outbox.get(timeout=remaining)
+            except queue.Empty:
+                break
+            next_len = batch_len + len(TG_BATCH_SEPARATOR) + len(text)
+            if next_len > TG_MESSAGE_MAX_LEN:
+                carry = text
+                break
+            batch.append(text)
+            batch_len = next_len
+
+        try:
+            tg_send_message(TG_BATCH_SEPARATOR.join(batch))
+        except Exception as e:
+            if len(batch) == 1:
+                log.exception("Failed sending Telegram message: %s", e)
+            else:
+                log.warning("Failed sending Telegram batch of %s message(s), sending one by one: %s", len(batch), e)
+                for text in batch:
+                    try:
+                        tg_send_message(text)
+                    except Exception as e:
+                        log.exception("Failed sending Telegram message: %s", e)
+        finally:
+            for _ in batch:
+                tg_outbox.task_done()
+
+
+def tg_drain_outbox(timeout_sec: float) -> bool:
+    deadline = time.monotonic() + timeout_sec
+    with tg_outbox.all_tasks_done:
+        while tg_outbox.unfinished_tasks:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            tg_outbox.all_tasks_done.wait(remaining)
+    return True
+
+
 def tg_get_updates(offset: Optional[int] = None, timeout_sec: int = TG_COMMAND_POLL_TIMEOUT_SEC) -> List[Dict[str, Any]]:
     params: Dict[str, Any] = {
         "timeout": timeout_sec,
@@ -333,6 +558,56 @@ def tg_get_updates(offset: Optional[int] = None, timeout_sec: int = TG_COMMAND_P
 # ==========================
 # Bybit REST helpers + cache
 # ==========================
+BYBIT_REST_MAX_WORKERS = 8
+# Bybit индексирует ордер с задержкой: промах помним недолго
+ORDER_NOT_FOUND_TTL_SEC = 5
+# Статус и SL/TP активного ордера ещё меняются
+ORDER_ACTIVE_TTL_SEC = 5
+
+NS_PER_SEC = 1_000_000_000
+CACHE_MISS = object()
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш со сроком жизни записей"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[Any, Tuple[int, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return default
+            expires_at, data = item
+            if time.monotonic_ns() > expires_at:
+                del self._items[key]
+                return default
+            self._items.move_to_end(key)
+            return data
+
+    def put(self, key: Any, data: Any, max_items: int, ttl_sec: int) -> None:
+        with self._lock:
+            now = time.monotonic_ns()
+            self._items[key] = (now + ttl_sec * NS_PER_SEC, data)
+            self._items.move_to_end(key)
+            if len(self._items) > max_items * 0.9:
+                self._sweep_expired(now)
+            while len(self._items) > max_items:
+                self._items.popitem(last=False)
+
+    def _sweep_expired(self, now: int) -> None:
+        while self._items:
+            expires_at, _ = next(iter(self._items.values()))
+            if now <= expires_at:
+                return
+            self._items.popitem(last=False)
+
+
 class BybitRest:
     def __init__(self, testnet: bool):
         self.testnet = testnet
@@ -341,46 +616,66 @@ class BybitRest:
             api_key=BYBIT_API_KEY,
             api_secret=BYBIT_API_SECRET,
         )
-        self._order_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
-        self._position_cache: Dict[Tuple[str, str], Tuple[float, Dict[str, Any]]] = {}
-        self._rsi_cache: Dict[Tuple[str, str, str, int], Tuple[float, Optional[float]]] = {}
-        self._funding_cache: Dict[Tuple[str, str, str, str], Tuple[float, Optional[Dict[str, Any]]]] = {}
-        self._kline_cache: Dict[Tuple[str, str, str, int], Tuple[float, List[Dict[str, float]]]] = {}
-        self._open_interest_cache: Dict[Tuple[str, str], Tuple[float, Optional[float]]] = {}
-
-    def _cache_get(self, order_id: str, ttl_sec: int) -> Optional[Dict[str, Any]]:
-        item = self._order_cache.get(order_id)
-        if not item:
-            return None
-        ts, data = item
-        if time.time() - ts > ttl_sec:
-            self._order_cache.pop(order_id, None)
-            return None
-        return data
-
-    def _cache_put(self, order_id: str, data: Dict[str, Any], max_items: int) -> None:
-        self._order_cache[order_id] = (time.time(), data)
-        if len(self._order_cache) > max_items:
-            items = sorted(self._order_cache.items(), key=lambda kv: kv[1][0])
-            for k, _ in items[: max(1, len(items) - max_items)]:
-                self._order_cache.pop(k, None)
-
-    def _position_cache_get(self, key: Tuple[str, str], ttl_sec: int) -> Optional[Dict[str, Any]]:
-        item = self._position_cache.get(key)
-        if not item:
-            return None
-        ts, data = item
-        if time.time() - ts > ttl_sec:
-            self._position_cache.pop(key, None)
-            return None
-        return data
+        self._order_cache = LRUCache()
+        self._order_miss_cache = LRUCache()
+        self._position_cache = LRUCache()
+        self._rsi_cache = LRUCache()
+        self._funding_cache = LRUCache()
+        self._kline_cache = LRUCache()
+        self._open_interest_cache = LRUCache()
+        self._inflight_lock = threading.Lock()
+        self._inflight: Dict[Tuple[Any, ...], cf.Future] = {}
+        base = "https://testnet.bybit.com" if testnet else "https://www.bybit.com"
+        self._link_prefix_default = f"{base}/trade/usdt/"
+        self._link_prefix: Dict[str, str] = {
+            c: f"{base}/trade/{path}/" for c, path in BYBIT_TRADE_PATH_BY_CATEGORY.items()
+        }
+        self._pool = cf.ThreadPoolExecutor(max_workers=BYBIT_REST_MAX_WORKERS, thread_name_prefix="bybit-rest")
+        self.http.client.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=BYBIT_REST_MAX_WORKERS * 2))
+
+    def submit(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> cf.Future:
+        return self._pool.submit(fn, *args, **kwargs)
 
-    def _position_cache_put(self, key: Tuple[str, str], data: Dict[str, Any], max_items: int) -> None:
-        self._position_cache[key] = (time.time(), data)
-        if len(self._position_cache) > max_items:
-            items = sorted(self._position_cache.items(), key=lambda kv: kv[1][0])
-            for k, _ in items[: max(1, len(items) - max_items)]:
-                self._position_cache.pop(k, None)
+    def _singleflight(self, key: Tuple[Any, ...], fn: Callable[..., Any], *args: Any) -> Any:
+        """Один вызов fn на ключ; параллельные вызовы ждут его результата"""
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = cf.Future()
+                self._inflight[key] = future
+
+        if not is_leader:
+            return future.result()
+
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def _cache_get(self, order_id: str) -> Optional[Dict[str, Any]]:
+        return self._order_cache.get(order_id)
+
+    def _cache_put(self, order_id: str, data: Dict[str, Any], max_items: int, ttl_sec: int) -> None:
+        self._order_cache.put(order_id, data, max_items, ttl_sec)
+
+    def _cache_order(self, order_id: str, data: Dict[str, Any], max_items: int, ttl_sec: int) -> None:
+        if str(data.get("orderStatus") or "").lower() not in ORDER_FINAL_STATUSES:
+            ttl_sec = min(ttl_sec, ORDER_ACTIVE_TTL_SEC)
+        self._cache_put(order_id, data, max_items, ttl_sec)
+
+    def _position_cache_get(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        return self._position_cache.get(key)
+
+    def _position_cache_put(self, key: Tuple[str, str], data: Dict[str, Any], max_items: int, ttl_sec: int) -> None:
+        self._position_cache.put(key, data, max_items, ttl_sec)
 
     def get_order_details(
         self,
@@ -393,35 +688,64 @@ class BybitRest:
         if not order_id:
             return {}
 
-        cached = self._cache_get(order_id, cache_ttl_sec)
+        cached = self._cache_get(order_id)
         if cached is not None:
             return cached
+        if self._order_miss_cache.get(order_id) is not None:
+            return {}
 
-        c = (category or "").lower()
+        c = normalize_category(category)
         if not c:
             return {}
 
+        return self._singleflight(("order", order_id), self._fetch_order_details, c, symbol, order_id, cache_ttl_sec, cache_max)
+
+    def _fetch_order_details(self, c: str, symbol: str, order_id: str, cache_ttl_sec: int, cache_max: int) -> Dict[str, Any]:
+        # Кэш мог заполнить предыдущий лидер
+        cached = self._cache_get(order_id)
+        if cached is not None:
+            return cached
+        if self._order_miss_cache.get(order_id) is not None:
+            return {}
+
+        recent = self._singleflight(
+            ("order_history", c, symbol),
+            self._fetch_recent_orders,
+            c,
+            symbol,
+            cache_ttl_sec,
+            cache_max,
+        )
+        found = recent.get(str(order_id))
+        if found is not None:
+            self._cache_order(order_id, found, cache_max, cache_ttl_sec)
+            return found
+
         try:
             resp = self.http.get_order_history(category=c, symbol=symbol, orderId=order_id, limit=50)
             lst = (((resp or {}).get("result") or {}).get("list") or [])
             if lst:
-                self._cache_put(order_id, lst[0], cache_max)
+                self._cache_order(order_id, lst[0], cache_max, cache_ttl_sec)
                 return lst[0]
         except Exception as e:
-            log.warning(f"Order details by orderId failed: {e}")
+            log.warning("Order details by orderId failed: %s", e)
+
+        self._order_miss_cache.put(order_id, True, cache_max, ORDER_NOT_FOUND_TTL_SEC)
+        return {}
 
+    def _fetch_recent_orders(self, c: str, symbol: str, cache_ttl_sec: int, cache_max: int) -> Dict[str, Dict[str, Any]]:
         try:
             resp = self.http.get_order_history(category=c, symbol=symbol, limit=50)
-            lst = (((resp or {}).get("result") or {}).get("list") or [])
-            for it in lst:
-                if str(it.get("orderId", "")) == str(order_id):
-                    self._cache_put(order_id, it, cache_max)
-                    return it
         except Exception as e:
-            log.warning(f"Order details fallback failed: {e}")
+            log.warning("Recent order history failed for %s: %s", symbol, e)
+            return {}
 
-        self._cache_put(order_id, {}, cache_max)
-        return {}
+        lst = (((resp or {}).get("result") or {}).get("list") or [])
+        by_id = {str(it.get("orderId", "")): it for it in lst}
+        for oid, it in by_id.items():
+            if oid:
+                self._cache_order(oid, it, cache_max, cache_ttl_sec)
+        return by_id
 
     def get_position_details(
         self,
@@ -430,25 +754,29 @@ class BybitRest:
         cache_ttl_sec: int = 15,
         cache_max: int = 2000,
     ) -> Dict[str, Any]:
-        c = (category or "").lower()
-        if not c or not symbol:
+        c = normalize_category(category)
+        if c not in POSITION_CATEGORIES or not symbol:
             return {}
 
         key = (c, symbol)
-        cached = self._position_cache_get(key, cache_ttl_sec)
+        cached = self._position_cache_get(key)
         if cached is not None:
             return cached
 
+        return self._singleflight(("position", c, symbol), self._fetch_position_details, key, cache_ttl_sec, cache_max)
+
+    def _fetch_position_details(self, key: Tuple[str, str], cache_ttl_sec: int, cache_max: int) -> Dict[str, Any]:
+        c, symbol = key
         try:
             resp = self.http.get_positions(category=c, symbol=symbol)
             lst = (((resp or {}).get("result") or {}).get("list") or [])
             if lst:
-                self._position_cache_put(key, lst[0], cache_max)
+                self._position_cache_put(key, lst[0], cache_max, cache_ttl_sec)
                 return lst[0]
         except Exception as e:
-            log.warning(f"Position details failed: {e}")
+            log.warning("Position details failed: %s", e)
 
-        self._position_cache_put(key, {}, cache_max)
+        self._position_cache_put(key, {}, cache_max, cache_ttl_sec)
         return {}
 
     def get_rsi(
@@ -458,49 +786,53 @@ class BybitRest:
         interval: str,
         length: int = 14,
         cache_ttl_sec: int = 300,
+        cache_max: int = 500,
     ) -> Optional[float]:
-        c = (category or "").lower()
+        c = normalize_category(category)
         if not c or not symbol:
             return None
 
         cache_key = (c, symbol, str(interval), length)
         cached = self._rsi_cache.get(cache_key)
-        if cached and (time.time() - cached[0]) <= cache_ttl_sec:
-            return cached[1]
-
-        try:
-            resp = self.http.get_kline(category=c, symbol=symbol, interval=str(interval), limit=200)
-            rows = (((resp or {}).get("result") or {}).get("list") or [])
-            if not rows or len(rows) < (length + 2):
-                return None
-
-            rows = sorted(rows, key=lambda r: int(r[0]))
-            closes = [float(r[4]) for r in rows]
+        if cached is not None:
+            return cached
 
-            gains = []
-            losses = []
-            for i in range(1, len(closes)):
-                delta = closes[i] - closes[i - 1]
-                gains.append(max(delta, 0.0))
-                losses.append(max(-delta, 0.0))
+        return self._singleflight(("rsi",) + cache_key, self._fetch_rsi, cache_key, cache_ttl_sec, cache_max)
 
-            avg_gain = sum(gains[:length]) / length
-            avg_loss = sum(losses[:length]) / length
+    def _fetch_rsi(
+        self,
+        cache_key: Tuple[str, str, str, int],
+        cache_ttl_sec: int,
+        cache_max: int,
+    ) -> Optional[float]:
+        c, symbol, interval, length = cache_key
+        try:
+            interval_ms = get_interval_ms(interval)
+            fetched_at_ms, rows = self.get_kline_page(c, symbol, interval=interval, limit=250)
+            completed = get_completed_klines(rows, interval)
+            if completed and interval_ms is not None:
+                closed_at_ms = int(completed[-1]["start"]) + interval_ms
+                if fetched_at_ms < closed_at_ms:
+                    # Страница снята до закрытия свечи: close ещё не финальный
+                    fetched_at_ms, rows = self.get_kline_page(
+                        c, symbol, interval=interval, limit=250, min_fetched_at_ms=closed_at_ms
+                    )
+                    completed = get_completed_klines(rows, interval)
 
-            for i in range(length, len(gains)):
-                avg_gain = (avg_gain * (length - 1) + gains[i]) / length
-                avg_loss = (avg_loss * (length - 1) + losses[i]) / length
+            result = calc_rsi_from_closes([row["close"] for row in completed], length=length)
+            if result is None:
+                return None
 
-            if avg_loss == 0:
-                result = 100.0
+            # RSI по закрытым свечам меняется только на следующем закрытии
+            if interval_ms is not None:
+                ttl_sec = (int(completed[-1]["start"]) + 2 * interval_ms - int(time.time() * 1000)) // 1000
             else:
-                rs = avg_gain / avg_loss
-                result = 100.0 - (100.0 / (1.0 + rs))
-
-            self._rsi_cache[cache_key] = (time.time(), result)
+                ttl_sec = cache_ttl_sec
+            if ttl_sec > 0:
+                self._rsi_cache.put(cache_key, result, cache_max, ttl_sec)
             return result
         except Exception as e:
-            log.warning(f"RSI calc failed: {e}")
+            log.warning("RSI calc failed: %s", e)
             return None
 
     def get_rsi_4h(self, category: str, symbol: str, length: int = 14) -> Optional[float]:
@@ -510,13 +842,7 @@ class BybitRest:
         return self.get_rsi(category=category, symbol=symbol, interval="60", length=length)
 
     def make_bybit_link(self, category: str, symbol: str) -> str:
-        c = (category or "").lower()
-        base = "https://testnet.bybit.com" if self.testnet else "https://www.bybit.com"
-        if c == "spot":
-            return f"{base}/trade/spot/{symbol}"
-        if c == "inverse":
-            return f"{base}/trade/inverse/{symbol}"
-        return f"{base}/trade/usdt/{symbol}"
+        return self._link_prefix.get(normalize_category(category), self._link_prefix_default) + symbol
 
     @staticmethod
     def make_tv_link(symbol: str) -> str:
@@ -536,7 +862,7 @@ class BybitRest:
                     result.append(enriched)
             return result
         except Exception as e:
-            log.warning(f"Failed to get open positions: {e}")
+            log.warning("Failed to get open positions: %s", e)
             return []
 
     def get_ticker_info(self, category: str, symbol: str) -> Dict[str, Any]:
@@ -547,7 +873,7 @@ class BybitRest:
             if lst:
                 return lst[0]
         except Exception as e:
-            log.warning(f"Failed to get ticker info for {symbol}: {e}")
+            log.warning("Failed to get ticker info for %s: %s", symbol, e)
         return {}
 
     def get_all_open_limit_orders(self, categories: Optional[List[str]] = None) -> List[Dict[str, Any]]:
@@ -562,7 +888,7 @@ class BybitRest:
                 try:
                     resp = self.http.get_open_orders(**query)
                 except Exception as e:
-                    log.warning(f"Failed to get open orders for {category}: {e}")
+                    log.warning("Failed to get open orders for %s: %s", category, e)
                     break
 
                 result = (resp or {}).get("result") or {}
@@ -575,7 +901,7 @@ class BybitRest:
 
                     if order_type != "limit":
                         continue
-                    if status in {"filled", "cancelled", "rejected", "deactivated", "partiallyfilledcanceled"}:
+                    if status in ORDER_FINAL_STATUSES:
                         continue
                     if leaves_qty is None:
                         leaves_qty = qty or 0.0
@@ -609,34 +935,49 @@ class BybitRest:
         interval: str,
         limit: int = 250,
         cache_ttl_sec: int = 90,
+        cache_max: int = 500,
     ) -> List[Dict[str, float]]:
-        c = (category or "").lower()
+        return self.get_kline_page(category, symbol, interval, limit, cache_ttl_sec, cache_max)[1]
+
+    def get_kline_page(
+        self,
+        category: str,
+        symbol: str,
+        interval: str,
+        limit: int = 250,
+        cache_ttl_sec: int = 90,
+        cache_max: int = 500,
+        min_fetched_at_ms: int = 0,
+    ) -> Tuple[int, List[Dict[str, float]]]:
+        """Возвращает (время загрузки в мс, свечи); кэш старше min_fetched_at_ms не используется"""
+        c = normalize_category(category)
         if not c or not symbol:
-            return []
+            return 0, []
 
         cache_key = (c, symbol, str(interval), limit)
         cached = self._kline_cache.get(cache_key)
-        if cached and (time.time() - cached[0]) <= cache_ttl_sec:
-            return list(cached[1])
+        if cached is not None and cached[0] >= min_fetched_at_ms:
+            return cached[0], list(cached[1])
 
         try:
+            fetched_at_ms = int(time.time() * 1000)
             resp = self.http.get_kline(category=c, symbol=symbol, interval=str(interval), limit=limit)
             rows = parse_kline_rows((((resp or {}).get("result") or {}).get("list") or []))
-            self._kline_cache[cache_key] = (time.time(), rows)
-            return list(rows)
+            self._kline_cache.put(cache_key, (fetched_at_ms, rows), cache_max, cache_ttl_sec)
+            return fetched_at_ms, list(rows)
         except Exception as e:
-            log.warning(f"Failed to get kline rows for {symbol} interval={interval}: {e}")
-            return []
+            log.warning("Failed to get kline rows for %s interval=%s: %s", symbol, interval, e)
+            return 0, []
 
-    def get_open_interest_value(self, category: str, symbol: str, interval_time: str = "5min", cache_ttl_sec: int = 120) -> Optional[float]:
-        c = (category or "").lower()
+    def get_open_interest_value(self, category: str, symbol: str, interval_time: str = "5min", cache_ttl_sec: int = 120, cache_max: int = 2000) -> Optional[float]:
+        c = normalize_category(category)
         if not c or not symbol:
             return None
 
         cache_key = (c, symbol)
-        cached = self._open_interest_cache.get(cache_key)
-        if cached and (time.time() - cached[0]) <= cache_ttl_sec:
-            return cached[1]
+        cached = self._open_interest_cache.get(cache_key, CACHE_MISS)
+        if cached is not CACHE_MISS:
+            return cached
 
         value = None
         ticker = self.get_ticker_info(c, symbol)
@@ -652,9 +993,9 @@ class BybitRest:
                 if rows:
                     value = to_float(rows[0].get("openInterest"))
             except Exception as e:
-                log.warning(f"Failed to get open interest for {symbol}: {e}")
+                log.warning("Failed to get open interest for %s: %s", symbol, e)
 
-        self._open_interest_cache[cache_key] = (time.time(), value)
+        self._open_interest_cache.put(cache_key, value, cache_max, cache_ttl_sec)
         return value
 
     def get_position_funding_total(
@@ -664,18 +1005,19 @@ class BybitRest:
         side: str,
         position_created_time: str = "",
         cache_ttl_sec: int = 60,
+        cache_max: int = 2000,
     ) -> Optional[Dict[str, Any]]:
         cache_key = (
-            (category or "").lower(),
+            normalize_category(category),
             symbol,
             (side or "").lower(),
             str(position_created_time or ""),
         )
-        cached = self._funding_cache.get(cache_key)
-        if cached and (time.time() - cached[0]) <= cache_ttl_sec:
-            return cached[1]
+        cached = self._funding_cache.get(cache_key, CACHE_MISS)
+        if cached is not CACHE_MISS:
+            return cached
 
-        c = (category or "").lower()
+        c = normalize_category(category)
         if not c or not symbol:
             return None
 
@@ -734,7 +1076,7 @@ class BybitRest:
 
                 end_time = start_time - 1
         except Exception as e:
-            log.warning(f"Failed to get cumulative funding for {symbol}: {e}")
+            log.warning("Failed to get cumulative funding for %s: %s", symbol, e)
 
         if funding_records > 0:
             found = {
@@ -743,7 +1085,7 @@ class BybitRest:
                 "records": funding_records,
             }
 
-        self._funding_cache[cache_key] = (time.time(), found)
+        self._funding_cache.put(cache_key, found, cache_max, cache_ttl_sec)
         return found
 
 
@@ -756,11 +1098,11 @@ position_state: Dict[Tuple[str, str], Dict[str, Any]] = {}
 
 def get_prev_position_snapshot(category: str, symbol: str) -> Dict[str, Any]:
     with position_state_lock:
-        return dict(position_state.get((category.lower(), symbol), {}))
+        return dict(position_state.get((normalize_category(category), symbol), {}))
 
 
 def update_position_snapshot(category: str, symbol: str, details: Dict[str, Any]) -> None:
-    key = (category.lower(), symbol)
+    key = (normalize_category(category), symbol)
     size = to_float(details.get("size")) or 0.0
     with position_state_lock:
         if size <= 0:
@@ -777,6 +1119,43 @@ def update_position_snapshot(category: str, symbol: str, details: Dict[str, Any]
 # ==========================
 # Message builder
 # ==========================
+EXEC_MSG_HEAD_TEMPLATE = (
+    "🔔 <b>{title}</b>\n"
+    "\n"
+    "<b>Биржа:</b> Bybit\n"
+    "<b>Тип рынка:</b> {market_type}\n"
+    "<b>Инструмент:</b> {symbol}\n"
+    "<b>Сторона:</b> {side}\n"
+    "<b>Тип ордера:</b> {order_type}\n"
+    "<b>Статус:</b> {order_status}\n"
+    "\n"
+    "<b>Средняя цена исполнения:</b> {avg_fill_price}\n"
+    "<b>Суммарный объем:</b> {filled_qty}\n"
+    "<b>Сумма:</b> {filled_notional}\n"
+    "<b>Суммарная комиссия:</b> {fee} {fee_coin}"
+)
+EXEC_MSG_TAIL_TEMPLATE = (
+    "<b>RSI (4H):</b> {rsi}\n"
+    "\n"
+    "<b>Время:</b> {local_dt} ({utc_off})\n"
+    "<b>ID исполнения:</b> {exec_id}\n"
+    "<b>Order ID:</b> {order_id}\n"
+    "\n"
+    "🔗 <a href='{bybit_link}'>Bybit</a> | <a href='{tv_link}'>TradingView</a>"
+)
+EXEC_MSG_LBL_EXEC_COUNT = "<b>Количество исполнений:</b> "
+EXEC_MSG_LBL_SL_SHORT = "<b>SL:</b> "
+EXEC_MSG_LBL_TP_SHORT = "<b>TP:</b> "
+EXEC_MSG_LBL_ENTRY = "<b>Цена входа:</b> "
+EXEC_MSG_LBL_EXIT = "<b>Цена выхода:</b> "
+EXEC_MSG_LBL_CHANGE = "<b>Соотношение (%):</b> "
+EXEC_MSG_LBL_REALIZED_PNL = "<b>Реализованный PnL:</b> "
+EXEC_MSG_LBL_CURRENT_PNL = "<b>Текущий PnL:</b> "
+EXEC_MSG_LBL_SL = "<b>Stop Loss:</b> "
+EXEC_MSG_LBL_TP = "<b>Take Profit:</b> "
+EXEC_MSG_LBL_RR = "<b>R:R:</b> "
+
+
 def resolve_event_title(
     side: str,
     reduce_only: bool,
@@ -799,11 +1178,13 @@ def resolve_event_title(
 
 
 def build_message(exec_evt: Dict[str, Any], rest: BybitRest) -> str:
-    category = str(exec_evt.get("category", "") or exec_evt.get("categoryType", "") or "")
-    market_type = map_market_type(category)
+    raw_category = str(exec_evt.get("category", "") or exec_evt.get("categoryType", "") or "")
+    market_type = map_market_type(raw_category)
 
-    symbol = str(exec_evt.get("symbol", "—"))
-    side = str(exec_evt.get("side", "—"))
+    category = normalize_category(raw_category)
+    symbol = sys.intern(str(exec_evt.get("symbol", "—")))
+    side = sys.intern(str(exec_evt.get("side", "—")))
+    side_l = side.lower()
     order_type = exec_evt.get("orderType", exec_evt.get("order_type", "—"))
     order_status = exec_evt.get("orderStatus", exec_evt.get("order_status", "—"))
 
@@ -828,9 +1209,16 @@ def build_message(exec_evt: Dict[str, Any], rest: BybitRest) -> str:
     )
 
     ts_ms = int(exec_evt.get("execTime", exec_evt.get("ts", 0)) or 0)
-    local_dt, utc_off = utc_to_local(ts_ms, UTC_OFFSET_HOURS)
+    if ts_ms:
+        local_dt, utc_off = utc_to_local(ts_ms, UTC_OFFSET_HOURS)
+    else:
+        local_dt, utc_off = "—", LOCAL_TZ_LABEL
 
-    order_details = rest.get_order_details(category, symbol, order_id) if (order_id and category) else {}
+    order_future = rest.submit(rest.get_order_details, category, symbol, order_id) if (order_id and category) else None
+    position_future = rest.submit(rest.get_position_details, category, symbol) if category else None
+    rsi_future = rest.submit(rest.get_rsi_4h, category, symbol, length=14)
+
+    order_details = order_future.result() if order_future else {}
     if order_status in ("—", "", None):
         order_status = order_details.get("orderStatus", "—")
     if realized_pnl is None:
@@ -839,7 +1227,7 @@ def build_message(exec_evt: Dict[str, Any], rest: BybitRest) -> str:
     stop_loss = to_float(order_details.get("stopLoss"))
     take_profit = to_float(order_details.get("takeProfit"))
 
-    position_details = rest.get_position_details(category, symbol) if category else {}
+    position_details = position_future.result() if position_future else {}
     if current_pnl is None:
         current_pnl = to_float(
             position_details.get("unrealisedPnl")
@@ -853,77 +1241,79 @@ def build_message(exec_evt: Dict[str, Any], rest: BybitRest) -> str:
     prev_entry = to_float(prev_snapshot.get("avgPrice"))
 
     reduce_only = str(exec_evt.get("reduceOnly", order_details.get("reduceOnly", ""))).lower() in ("1", "true", "t", "yes")
-    title = resolve_event_title(side, reduce_only, prev_size, current_size)
+    title = resolve_event_title(side_l, reduce_only, prev_size, current_size)
 
-    entry_price_for_rr = to_float(avg_fill_price)
-    if title in ("Частичное закрытие", "Закрытие позиции") and prev_entry is not None:
-        entry_price_for_rr = prev_entry
+    fill_price = to_float(avg_fill_price)
+    is_close = title in ("Частичное закрытие", "Закрытие позиции")
+    entry_price_for_rr = prev_entry if is_close and prev_entry is not None else fill_price
 
-    rr_ratio = calc_rr(side, entry_price_for_rr, stop_loss, take_profit)
+    rr_ratio = calc_rr(side_l, entry_price_for_rr, stop_loss, take_profit)
 
-    rsi = rest.get_rsi_4h(category, symbol, length=14)
+    rsi = rsi_future.result()
     rsi_str = fmt_num(rsi, 2) if rsi is not None else "n/a"
 
     bybit_link = rest.make_bybit_link(category, symbol)
     tv_link = rest.make_tv_link(symbol)
 
     lines = [
-        f"🔔 <b>{title}</b>",
-        "",
-        f"<b>Биржа:</b> Bybit",
-        f"<b>Тип рынка:</b> {market_type}",
-        f"<b>Инструмент:</b> {symbol}",
-        f"<b>Сторона:</b> {side}",
-        f"<b>Тип ордера:</b> {order_type}",
-        f"<b>Статус:</b> {order_status}",
-        "",
-        f"<b>Средняя цена исполнения:</b> {fmt_num(avg_fill_price)}",
-        f"<b>Суммарный объем:</b> {fmt_num(filled_qty)}",
-        f"<b>Сумма:</b> {fmt_num(filled_notional)}",
-        f"<b>Суммарная комиссия:</b> {fmt_num(fee)} {fee_coin}",
+        EXEC_MSG_HEAD_TEMPLATE.format(
+            title=title,
+            market_type=market_type,
+            symbol=symbol,
+            side=side,
+            order_type=order_type,
+            order_status=order_status,
+            avg_fill_price=fmt_num(avg_fill_price),
+            filled_qty=fmt_num(filled_qty),
+            filled_notional=fmt_num(filled_notional),
+            fee=fmt_num(fee),
+            fee_coin=fee_coin,
+        ),
     ]
 
     if exec_count > 1:
-        lines.append(f"<b>Количество исполнений:</b> {exec_count}")
+        lines.append(f"{EXEC_MSG_LBL_EXEC_COUNT}{exec_count}")
 
     if title == "Открыта позиция" and stop_loss is not None and take_profit is not None:
-        lines.append(f"<b>SL:</b> {fmt_num(stop_loss)}")
-        lines.append(f"<b>TP:</b> {fmt_num(take_profit)}")
+        lines.append(f"{EXEC_MSG_LBL_SL_SHORT}{fmt_num(stop_loss)}")
+        lines.append(f"{EXEC_MSG_LBL_TP_SHORT}{fmt_num(take_profit)}")
 
-    if title in ("Частичное закрытие", "Закрытие позиции"):
-        exit_price = to_float(avg_fill_price)
-        position_direction = prev_snapshot.get("side") or ("buy" if str(side).lower() == "sell" else "sell")
+    if is_close:
+        exit_price = fill_price
+        position_direction = prev_snapshot.get("side") or ("buy" if side_l == "sell" else "sell")
         change_pct = calc_change_percent(str(position_direction), prev_entry, exit_price)
         if prev_entry is not None:
-            lines.append(f"<b>Цена входа:</b> {fmt_num(prev_entry)}")
+            lines.append(f"{EXEC_MSG_LBL_ENTRY}{fmt_num(prev_entry)}")
         if exit_price is not None:
-            lines.append(f"<b>Цена выхода:</b> {fmt_num(exit_price)}")
+            lines.append(f"{EXEC_MSG_LBL_EXIT}{fmt_num(exit_price)}")
         if change_pct is not None:
-            lines.append(f"<b>Соотношение (%):</b> {fmt_num(change_pct, 2)}%")
+            lines.append(f"{EXEC_MSG_LBL_CHANGE}{fmt_num(change_pct, 2)}%")
 
     if realized_pnl is not None:
-        lines.append(f"<b>Реализованный PnL:</b> {fmt_num(realized_pnl)} {pnl_coin}")
+        lines.append(f"{EXEC_MSG_LBL_REALIZED_PNL}{fmt_num(realized_pnl)} {pnl_coin}")
     if current_pnl is not None:
-        lines.append(f"<b>Текущий PnL:</b> {fmt_num(current_pnl)} {pnl_coin}")
+        lines.append(f"{EXEC_MSG_LBL_CURRENT_PNL}{fmt_num(current_pnl)} {pnl_coin}")
 
     if title != "Открыта позиция":
         if stop_loss is not None:
-            lines.append(f"<b>Stop Loss:</b> {fmt_num(stop_loss)}")
+            lines.append(f"{EXEC_MSG_LBL_SL}{fmt_num(stop_loss)}")
         if take_profit is not None:
-            lines.append(f"<b>Take Profit:</b> {fmt_num(take_profit)}")
+            lines.append(f"{EXEC_MSG_LBL_TP}{fmt_num(take_profit)}")
 
     if rr_ratio is not None:
-        lines.append(f"<b>R:R:</b> {fmt_num(rr_ratio, 2)}")
-
-    lines += [
-        f"<b>RSI (4H):</b> {rsi_str}",
-        "",
-        f"<b>Время:</b> {local_dt} ({utc_off})",
-        f"<b>ID исполнения:</b> {exec_id}",
-        f"<b>Order ID:</b> {order_id}",
-        "",
-        f"🔗 <a href='{bybit_link}'>Bybit</a> | <a href='{tv_link}'>TradingView</a>",
-    ]
+        lines.append(f"{EXEC_MSG_LBL_RR}{fmt_num(rr_ratio, 2)}")
+
+    lines.append(
+        EXEC_MSG_TAIL_TEMPLATE.format(
+            rsi=rsi_str,
+            local_dt=local_dt,
+            utc_off=utc_off,
+            exec_id=exec_id,
+            order_id=order_id,
+            bybit_link=bybit_link,
+            tv_link=tv_link,
+        )
+    )
 
     update_position_snapshot(category, symbol, position_details)
 
@@ -1135,7 +1525,7 @@ def funding_monitor_loop(rest: BybitRest):
                         funding_state[key] = True
 
         except Exception as e:
-            log.exception(f"Funding monitor error: {e}")
+            log.exception("Funding monitor error: %s", e)
 
         # Сон 120 секунд (2 минуты)
         time.sleep(120)
@@ -1206,17 +1596,23 @@ def build_indicator_snapshot(rest: BybitRest, category: str, symbol: str, curren
         "1h": "60",
         "15m": "15",
     }
+    kline_futures = {
+        label: rest.submit(rest.get_kline_rows, category, symbol, interval=interval, limit=250)
+        for label, interval in intervals.items()
+    }
+    open_interest_future = rest.submit(rest.get_open_interest_value, category, symbol)
+
     data: Dict[str, Any] = {
         "volume_change": {},
         "rsi": {},
         "atr": {},
         "ema_24h": {"ema20": None, "ema50": None, "position": "n/a"},
-        "open_interest": rest.get_open_interest_value(category, symbol),
+        "open_interest": open_interest_future.result(),
     }
 
     completed_by_label: Dict[str, List[Dict[str, float]]] = {}
     for label, interval in intervals.items():
-        rows = rest.get_kline_rows(category, symbol, interval=interval, limit=250)
+        rows = kline_futures[label].result()
         completed = get_completed_klines(rows, interval)
         completed_by_label[label] = completed
         closes = [row["close"] for row in completed]
@@ -1239,7 +1635,7 @@ def build_indicator_snapshot(rest: BybitRest, category: str, symbol: str, curren
 
 
 def build_position_message(position: Dict[str, Any], rest: BybitRest) -> str:
-    category = str(position.get("category") or "linear").lower()
+    category = normalize_category(str(position.get("category") or "linear"))
     symbol = str(position.get("symbol") or "n/a")
     side = str(position.get("side") or "")
     direction = "Long" if side.lower() == "buy" else "Short"
@@ -1348,7 +1744,7 @@ def telegram_command_loop(rest: BybitRest) -> None:
         if initial_updates:
             offset = max(safe_int(item.get("update_id")) for item in initial_updates) + 1
     except Exception as e:
-        log.warning(f"Failed to initialize Telegram command offset: {e}")
+        log.warning("Failed to initialize Telegram command offset: %s", e)
 
     while True:
         try:
@@ -1362,7 +1758,7 @@ def telegram_command_loop(rest: BybitRest) -> None:
                     send_positions_report(message, rest)
                     log.info("Processed Telegram /positions command chatId=%s", (message.get("chat") or {}).get("id"))
                 except Exception as e:
-                    log.exception(f"Failed handling /positions command: {e}")
+                    log.exception("Failed handling /positions command: %s", e)
                     tg_send_message(
                         "Не удалось собрать snapshot по позициям. Попробуй еще раз через минуту.",
                         chat_id=str((message.get("chat") or {}).get("id") or TG_CHAT_ID),
@@ -1370,7 +1766,7 @@ def telegram_command_loop(rest: BybitRest) -> None:
                         reply_to_message_id=safe_int(message.get("message_id")),
                     )
         except Exception as e:
-            log.exception(f"Telegram command loop error: {e}")
+            log.exception("Telegram command loop error: %s", e)
             time.sleep(TG_COMMAND_ERROR_SLEEP_SEC)
 
 
@@ -1465,7 +1861,7 @@ def limit_order_monitor_loop(rest: BybitRest) -> None:
                     continue
                 active_order_ids.add(order_id)
 
-                category = str(order.get("category") or "").lower()
+                category = normalize_category(str(order.get("category") or ""))
                 symbol = str(order.get("symbol") or "")
                 limit_price = to_float(order.get("price") or order.get("orderPrice"))
                 if not category or not symbol or limit_price is None or limit_price <= 0:
@@ -1509,7 +1905,7 @@ def limit_order_monitor_loop(rest: BybitRest) -> None:
                     fmt_num(distance_pct, 2),
                 )
         except Exception as e:
-            log.exception(f"Limit order monitor error: {e}")
+            log.exception("Limit order monitor error: %s", e)
         finally:
             cleanup_limit_order_alert_state(active_order_ids)
             time.sleep(LIMIT_ORDER_ALERT_INTERVAL_SEC)
@@ -1544,15 +1940,12 @@ class ExecutionAggregator:
     def __init__(self, window_sec: int):
         self.window_sec = max(1, window_sec)
         self._lock = threading.Lock()
-        self._execid_seen: Set[str] = set()
+        self._execid_seen: "OrderedDict[str, None]" = OrderedDict()
         self._pending_orders: Dict[str, AggregatedOrder] = {}
 
     @staticmethod
-    def _order_key(evt: Dict[str, Any]) -> Optional[str]:
-        order_id = str(evt.get("orderId", evt.get("order_id", "")) or "")
-        if order_id:
-            return f"order:{order_id}"
-        return None
+    def _order_key(order_id: str) -> str:
+        return f"order:{order_id}"
 
     @staticmethod
     def _is_trade(evt: Dict[str, Any]) -> bool:
@@ -1560,9 +1953,8 @@ class ExecutionAggregator:
         return not exec_type or exec_type == "trade"
 
     @staticmethod
-    def _should_flush(evt: Dict[str, Any]) -> bool:
-        status = str(evt.get("orderStatus", evt.get("order_status", "")) or "").lower()
-        if status in {"filled", "cancelled", "rejected", "deactivated", "partiallyfilledcanceled"}:
+    def _should_flush(evt: Dict[str, Any], status: str) -> bool:
+        if status.lower() in ORDER_FINAL_STATUSES:
             return True
 
         leaves_qty = to_float(evt.get("leavesQty") or evt.get("leaves_qty"))
@@ -1599,12 +1991,7 @@ class ExecutionAggregator:
             "pnl": agg.current_pnl,
         }
 
-    def _trim_exec_cache(self) -> None:
-        if len(self._execid_seen) <= EXECID_CACHE_MAX:
-            return
-        self._execid_seen = set(list(self._execid_seen)[-EXECID_CACHE_MAX:])
-
-    def _apply_execution(self, evt: Dict[str, Any], key: str) -> AggregatedOrder:
+    def _apply_execution(self, evt: Dict[str, Any], key: str, order_id: str, exec_id: str, status: str) -> AggregatedOrder:
         ts_ms = int(evt.get("execTime", evt.get("ts", 0)) or 0)
         agg = self._pending_orders.get(key)
 
@@ -1615,8 +2002,8 @@ class ExecutionAggregator:
                 symbol=str(evt.get("symbol", "—")),
                 side=str(evt.get("side", "—")),
                 order_type=str(evt.get("orderType", evt.get("order_type", "—"))),
-                order_status=str(evt.get("orderStatus", evt.get("order_status", "—"))),
-                order_id=str(evt.get("orderId", evt.get("order_id", "")) or ""),
+                order_status=status or "—",
+                order_id=order_id,
                 fee_coin=str(evt.get("feeCurrency", evt.get("feeCoin", "—"))),
                 pnl_coin=str(evt.get("pnlCurrency", evt.get("profitCurrency", "USDT"))),
                 first_ts_ms=ts_ms,
@@ -1651,15 +2038,24 @@ class ExecutionAggregator:
             agg.current_pnl = current_pnl
 
         agg.last_ts_ms = ts_ms
-        agg.last_exec_id = str(evt.get("execId", evt.get("exec_id", "—")))
-        agg.exec_ids.append(agg.last_exec_id)
+        agg.last_exec_id = exec_id
+        agg.exec_ids.append(exec_id)
 
-        status = str(evt.get("orderStatus", evt.get("order_status", "")) or "")
         if status:
             agg.order_status = status
 
         return agg
 
+    def _mark_seen(self, exec_id: str) -> bool:
+        if exec_id in self._execid_seen:
+            self._execid_seen.move_to_end(exec_id)
+            return True
+
+        self._execid_seen[exec_id] = None
+        if len(self._execid_seen) > EXECID_CACHE_MAX:
+            self._execid_seen.popitem(last=False)
+        return False
+
     def process_ws_message(self, message: Dict[str, Any]) -> List[Dict[str, Any]]:
         ready_events: List[Dict[str, Any]] = []
         data = message.get("data") or []
@@ -1675,24 +2071,29 @@ class ExecutionAggregator:
                 if not exec_id:
                     continue
 
-                if exec_id in self._execid_seen:
+                if self._mark_seen(exec_id):
                     continue
 
-                self._execid_seen.add(exec_id)
-                self._trim_exec_cache()
-
-                key = self._order_key(evt)
-                if not key:
+                order_id = str(evt.get("orderId", evt.get("order_id", "")) or "")
+                if not order_id:
                     ready_events.append(evt)
                     continue
 
-                agg = self._apply_execution(evt, key)
-                if self._should_flush(evt):
+                key = self._order_key(order_id)
+                status = str(evt.get("orderStatus", evt.get("order_status", "")) or "")
+                agg = self._apply_execution(evt, key, order_id, exec_id, status)
+                if self._should_flush(evt, status):
                     self._pending_orders.pop(key, None)
                     ready_events.append(self._build_event_from_agg(agg))
 
         return ready_events
 
+    def flush_all(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            ready_events = [self._build_event_from_agg(agg) for agg in self._pending_orders.values()]
+            self._pending_orders.clear()
+        return ready_events
+
     def flush_due(self) -> List[Dict[str, Any]]:
         now = time.time()
         ready_events: List[Dict[str, Any]] = []
@@ -1719,9 +2120,9 @@ aggregator = ExecutionAggregator(window_sec=ORDER_AGGREGATION_WINDOW_SEC)
 
 def send_event_message(evt: Dict[str, Any], rest: BybitRest, reason: str) -> None:
     text = build_message(evt, rest)
-    tg_send_message(text)
+    tg_enqueue_message(text)
     log.info(
-        "Sent aggregated order reason=%s orderId=%s executions=%s",
+        "Queued aggregated order reason=%s orderId=%s executions=%s",
         reason,
         evt.get("orderId", ""),
         evt.get("aggregatedExecCount", 1),
@@ -1733,7 +2134,7 @@ def on_execution_message(message: Dict[str, Any], rest: BybitRest) -> None:
         for evt in aggregator.process_ws_message(message):
             send_event_message(evt, rest, reason="event")
     except Exception as e:
-        log.exception(f"Failed processing WS message: {e}")
+        log.exception("Failed processing WS message: %s", e)
 
 
 def flush_loop(rest: BybitRest) -> None:
@@ -1742,7 +2143,7 @@ def flush_loop(rest: BybitRest) -> None:
             for evt in aggregator.flush_due():
                 send_event_message(evt, rest, reason="timeout")
         except Exception as e:
-            log.exception(f"Failed flushing aggregated orders: {e}")
+            log.exception("Failed flushing aggregated orders: %s", e)
         time.sleep(1)
 
 
@@ -1758,6 +2159,9 @@ def main() -> None:
 
     rest = BybitRest(testnet=BYBIT_TESTNET)
 
+    sender_thread = threading.Thread(target=telegram_sender_loop, daemon=True, name="telegram-sender-loop")
+    sender_thread.start()
+
     flush_thread = threading.Thread(target=flush_loop, args=(rest,), daemon=True, name="agg-flush-loop")
     flush_thread.start()
 
@@ -1786,8 +2190,22 @@ def main() -> None:
     log.info("Subscribed to private topic: execution")
     log.info("Waiting for execution events...")
 
-    while True:
-        time.sleep(1)
+    stop_event = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    stop_event.wait()
+
+    log.info("Shutdown signal received, closing WS connection...")
+    ws.exit()
+
+    for evt in aggregator.flush_all():
+        try:
+            send_event_message(evt, rest, reason="shutdown")
+        except Exception as e:
+            log.exception("Failed flushing aggregated order on shutdown: %s", e)
+
+    if not tg_drain_outbox(TG_SHUTDOWN_DRAIN_SEC):
+        log.warning("Telegram outbox not drained on shutdown, %s message(s) dropped", tg_outbox.unfinished_tasks)
 
 
 if __name__ == "__main__":